@@ -4,213 +4,278 @@ Python implementation of the KERN lexer for testing purposes.
 This simulates the Rust implementation to verify functionality.
 """
 
-class TokenType:
+import re
+import sys
+from array import array
+from bisect import bisect_right
+from enum import IntEnum
+from typing import Any, NamedTuple
+
+class TokenType(IntEnum):
     # Keywords
-    ENTITY = "ENTITY"
-    RULE = "RULE"
-    FLOW = "FLOW"
-    CONSTRAINT = "CONSTRAINT"
-    IF = "IF"
-    THEN = "THEN"
-    ELSE = "ELSE"
-    LOOP = "LOOP"
-    BREAK = "BREAK"
-    HALT = "HALT"
-    AND = "AND"
-    OR = "OR"
+    ENTITY = 1
+    RULE = 2
+    FLOW = 3
+    CONSTRAINT = 4
+    IF = 5
+    THEN = 6
+    ELSE = 7
+    LOOP = 8
+    BREAK = 9
+    HALT = 10
+    AND = 11
+    OR = 12
 
     # Identifiers and literals
-    IDENTIFIER = "IDENTIFIER"
-    NUMBER = "NUMBER"
+    IDENTIFIER = 13
+    NUMBER = 14
 
     # Symbols
-    COLON = "COLON"
-    COMMA = "COMMA"
-    DOT = "DOT"
-    LEFT_BRACE = "LEFT_BRACE"
-    RIGHT_BRACE = "RIGHT_BRACE"
-    LEFT_PAREN = "LEFT_PAREN"
-    RIGHT_PAREN = "RIGHT_PAREN"
-    EQUAL = "EQUAL"
-    NOT_EQUAL = "NOT_EQUAL"
-    GREATER = "GREATER"
-    LESS = "LESS"
-    GREATER_EQUAL = "GREATER_EQUAL"
-    LESS_EQUAL = "LESS_EQUAL"
-    ASSIGNMENT = "ASSIGNMENT"
+    COLON = 15
+    COMMA = 16
+    DOT = 17
+    LEFT_BRACE = 18
+    RIGHT_BRACE = 19
+    LEFT_PAREN = 20
+    RIGHT_PAREN = 21
+    EQUAL = 22
+    NOT_EQUAL = 23
+    GREATER = 24
+    LESS = 25
+    GREATER_EQUAL = 26
+    LESS_EQUAL = 27
+    ASSIGNMENT = 28
 
     # Error
-    ILLEGAL = "ILLEGAL"
+    ILLEGAL = 29
 
     # Special
-    EOF = "EOF"
+    EOF = 30
 
 
-class Token:
-    def __init__(self, token_type, value=None, line=1, column=1, position=0):
-        self.token_type = token_type
-        self.value = value
-        self.line = line
-        self.column = column
-        self.position = position
+class Token(NamedTuple):
+    token_type: TokenType
+    value: Any = None
+    line: int = 1
+    column: int = 1
+    position: int = 0
 
     def __repr__(self):
         if self.value is not None:
-            return f"Token({self.token_type}, '{self.value}', line={self.line})"
-        return f"Token({self.token_type}, line={self.line})"
+            return f"Token({self.token_type.name}, '{self.value}', line={self.line})"
+        return f"Token({self.token_type.name}, line={self.line})"
+
+
+# ASCII byte classes (the KERN grammar only admits ASCII letters and digits)
+_LETTERS = frozenset(b'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz_')
+_DIGITS = frozenset(b'0123456789')
+
+_WS_RE = re.compile(rb'\s+')
+_IDENT_RE = re.compile(rb'[A-Za-z_][A-Za-z0-9_]*')
+_NUM_RE = re.compile(rb'[0-9]+')
 
+_KEYWORDS = {
+    "entity": TokenType.ENTITY,
+    "rule": TokenType.RULE,
+    "flow": TokenType.FLOW,
+    "constraint": TokenType.CONSTRAINT,
+    "if": TokenType.IF,
+    "then": TokenType.THEN,
+    "else": TokenType.ELSE,
+    "loop": TokenType.LOOP,
+    "break": TokenType.BREAK,
+    "halt": TokenType.HALT,
+    "and": TokenType.AND,
+    "or": TokenType.OR,
+}
+# Longer identifiers can never be keywords
+_KEYWORD_MAX_LEN = max(map(len, _KEYWORDS))
 
-def is_letter(ch):
-    return ch.isalpha() or ch == '_'
+# Comparison and assignment operators, keyed by first then second byte;
+# the None entry is the one-character token when no second byte matches
+_OP_TRIE = {
+    ord('='): {ord('='): (TokenType.EQUAL, '=='), None: (TokenType.ASSIGNMENT, '=')},
+    ord('!'): {ord('='): (TokenType.NOT_EQUAL, '!=')},
+    ord('>'): {ord('='): (TokenType.GREATER_EQUAL, '>='), None: (TokenType.GREATER, '>')},
+    ord('<'): {ord('='): (TokenType.LESS_EQUAL, '<='), None: (TokenType.LESS, '<')},
+}
 
 
 class Lexer:
     def __init__(self, input_text):
-        self.input = input_text
+        self.input = input_text.encode('utf-8')
         self.position = 0
         self.read_position = 0
-        self.ch = '\0'
-        self.line = 1
-        self.column = 0
+        self.ch = 0
+        # Offsets of every newline, behind a sentinel for the first line, so
+        # line/column are only worked out when a token is built
+        self._line_starts = [-1]
+        newline = self.input.find(b'\n')
+        while newline != -1:
+            self._line_starts.append(newline)
+            newline = self.input.find(b'\n', newline + 1)
         self._read_char()
 
     def _read_char(self):
         if self.read_position >= len(self.input):
-            self.ch = '\0'
+            self.ch = 0
         else:
             self.ch = self.input[self.read_position]
 
         self.position = self.read_position
         self.read_position += 1
-        self.column += 1
-
-        if self.ch == '\n':
-            self.line += 1
-            self.column = 0
 
     def _peek_char(self):
         if self.read_position >= len(self.input):
-            return '\0'
+            return 0
         else:
             return self.input[self.read_position]
 
+    def _loc(self, position):
+        row = bisect_right(self._line_starts, position)
+        return row, position - self._line_starts[row - 1]
+
+    def _make_token(self, token_type, value, position):
+        line, column = self._loc(position)
+        return Token(token_type, value, line, column, position)
+
     def _skip_whitespace(self):
-        while self.ch.isspace():
-            if self.ch == '\n':
-                self.line += 1
-                self.column = 0
-            else:
-                self.column += 1
-            self._read_char()
-
-    def _read_identifier(self):
-        start_pos = self.position
-        while is_letter(self.ch) or self.ch.isdigit():
-            self._read_char()
-        return self.input[start_pos:self.position]
+        match = _WS_RE.match(self.input, self.position)
+        if match is not None:
+            self._advance_to(match.end())
+
+    def _advance_to(self, end):
+        # Equivalent to calling _read_char until position == end
+        self.read_position = end
+        self._read_char()
 
     def _read_number(self):
-        start_pos = self.position
-        while self.ch.isdigit():
-            self._read_char()
-        return int(self.input[start_pos:self.position])
-
-    def _lookup_identifier(self, identifier):
-        keywords = {
-            "entity": TokenType.ENTITY,
-            "rule": TokenType.RULE,
-            "flow": TokenType.FLOW,
-            "constraint": TokenType.CONSTRAINT,
-            "if": TokenType.IF,
-            "then": TokenType.THEN,
-            "else": TokenType.ELSE,
-            "loop": TokenType.LOOP,
-            "break": TokenType.BREAK,
-            "halt": TokenType.HALT,
-            "and": TokenType.AND,
-            "or": TokenType.OR,
-        }
-        return keywords.get(identifier, TokenType.IDENTIFIER)
+        match = _NUM_RE.match(self.input, self.position)
+        self._advance_to(match.end())
+        return int(match.group())
 
     def next_token(self):
         self._skip_whitespace()
 
-        if self.ch == '=':
-            if self._peek_char() == '=':
-                self._read_char()  # consume '='
-                token = Token(TokenType.EQUAL, '==', self.line, self.column - 1, self.position - 1)
-            else:
-                token = Token(TokenType.ASSIGNMENT, '=', self.line, self.column, self.position)
-        elif self.ch == '!':
-            if self._peek_char() == '=':
-                self._read_char()  # consume '='
-                token = Token(TokenType.NOT_EQUAL, '!=', self.line, self.column - 1, self.position - 1)
-            else:
-                # Error case: '!' not followed by '=' - this is an illegal character
-                current_ch = self.ch
-                self._read_char()
-                token = Token(TokenType.ILLEGAL, current_ch, self.line, self.column, self.position)
-        elif self.ch == '>':
-            if self._peek_char() == '=':
-                self._read_char()  # consume '='
-                token = Token(TokenType.GREATER_EQUAL, '>=', self.line, self.column - 1, self.position - 1)
-            else:
-                token = Token(TokenType.GREATER, '>', self.line, self.column, self.position)
-        elif self.ch == '<':
-            if self._peek_char() == '=':
-                self._read_char()  # consume '='
-                token = Token(TokenType.LESS_EQUAL, '<=', self.line, self.column - 1, self.position - 1)
-            else:
-                token = Token(TokenType.LESS, '<', self.line, self.column, self.position)
-        elif self.ch == '{':
-            token = Token(TokenType.LEFT_BRACE, '{', self.line, self.column, self.position)
-        elif self.ch == '}':
-            token = Token(TokenType.RIGHT_BRACE, '}', self.line, self.column, self.position)
-        elif self.ch == '(':
-            token = Token(TokenType.LEFT_PAREN, '(', self.line, self.column, self.position)
-        elif self.ch == ')':
-            token = Token(TokenType.RIGHT_PAREN, ')', self.line, self.column, self.position)
-        elif self.ch == ',':
-            token = Token(TokenType.COMMA, ',', self.line, self.column, self.position)
-        elif self.ch == '.':
-            token = Token(TokenType.DOT, '.', self.line, self.column, self.position)
-        elif self.ch == ':':
-            token = Token(TokenType.COLON, ':', self.line, self.column, self.position)
-        elif self.ch == '\0':
-            token = Token(TokenType.EOF, None, self.line, self.column, self.position)
-        elif is_letter(self.ch):
-            identifier = self._read_identifier()
-            token_type = self._lookup_identifier(identifier)
-            if token_type == TokenType.IDENTIFIER:
-                token = Token(token_type, identifier, self.line, self.column - len(identifier), self.position - len(identifier))
-            else:
-                token = Token(token_type, identifier, self.line, self.column - len(identifier), self.position - len(identifier))
-        elif self.ch in ('"', "'"):
-            # According to KERN spec, strings are not first-class citizens
-            # So we treat quotes as illegal characters
-            current_ch = self.ch
-            self._read_char()  # consume the quote
-            token = Token(TokenType.ILLEGAL, current_ch, self.line, self.column, self.position)
-        elif self.ch.isdigit():
-            number = self._read_number()
-            token = Token(TokenType.NUMBER, number, self.line, self.column - len(str(number)), self.position - len(str(number)))
-        else:
-            # Handle unrecognized characters
-            current_ch = self.ch
-            self._read_char()
-            token = Token(TokenType.ILLEGAL, current_ch, self.line, self.column, self.position)
+        handler = self._DISPATCH[self.ch]
+        if callable(handler):
+            return handler(self)
+        return self._emit_simple(handler)
 
+    def _emit_simple(self, entry):
+        token_type, text = entry
+        token = self._make_token(token_type, text, self.position)
         self._read_char()
         return token
 
+    def _emit_pair(self, token_type, text):
+        # Called on the first character of a two-character operator
+        token = self._make_token(token_type, text, self.position)
+        self._advance_to(self.position + 2)
+        return token
+
+    def _lex_operator(self):
+        node = _OP_TRIE[self.ch]
+        pair = node.get(self._peek_char())
+        if pair is not None:
+            return self._emit_pair(*pair)
+        single = node.get(None)
+        if single is None:
+            # e.g. '!' not followed by '=' - this is an illegal character
+            return self._lex_illegal()
+        return self._emit_simple(single)
+
+    def _lex_eof(self):
+        return self._make_token(TokenType.EOF, None, self.position)
+
+    def _lex_identifier(self):
+        # Scan, intern and classify in one step; identifiers longer than the
+        # longest keyword skip the keyword lookup
+        position = self.position
+        match = _IDENT_RE.match(self.input, position)
+        self._advance_to(match.end())
+        identifier = sys.intern(match.group().decode('ascii'))
+        if len(identifier) > _KEYWORD_MAX_LEN:
+            token_type = TokenType.IDENTIFIER
+        else:
+            token_type = _KEYWORDS.get(identifier, TokenType.IDENTIFIER)
+        return self._make_token(token_type, identifier, position)
+
+    def _lex_number(self):
+        position = self.position
+        number = self._read_number()
+        return self._make_token(TokenType.NUMBER, number, position)
+
+    def _lex_illegal(self):
+        # Non-ASCII input is reported as a single illegal character rather
+        # than one token per UTF-8 byte
+        position = self.position
+        end = position + 1
+        while end < len(self.input) and self.input[end] & 0xC0 == 0x80:
+            end += 1
+        current_ch = self.input[position:end].decode('utf-8', 'replace')
+        self._advance_to(end)
+        return self._make_token(TokenType.ILLEGAL, current_ch, position)
+
+    def iter_tokens(self):
+        next_token = self.next_token
+        eof = TokenType.EOF
+        while True:
+            token = next_token()
+            yield token
+            if token.token_type == eof:
+                return
+
     def tokenize_all(self):
+        next_token = self.next_token
+        eof = TokenType.EOF
         tokens = []
+        append = tokens.append
         while True:
-            token = self.next_token()
-            tokens.append(token)
-            if token.token_type == TokenType.EOF:
-                break
-        return tokens
+            token = next_token()
+            append(token)
+            if token.token_type == eof:
+                return tokens
+
+    def tokenize_soa(self):
+        # Column-oriented token stream: (types, values, lines, columns,
+        # positions), with the integer columns packed into C int arrays
+        types, values = array('B'), []
+        lines, columns, positions = array('i'), array('i'), array('i')
+        for token in self.iter_tokens():
+            types.append(token.token_type)
+            values.append(token.value)
+            lines.append(token.line)
+            columns.append(token.column)
+            positions.append(token.position)
+        return types, values, lines, columns, positions
+
+
+def _build_dispatch_table():
+    # Anything not listed below, including quotes (strings are not
+    # first-class citizens in KERN), lexes as an illegal character
+    table = [Lexer._lex_illegal] * 256
+    for text, token_type in (
+        ('{', TokenType.LEFT_BRACE),
+        ('}', TokenType.RIGHT_BRACE),
+        ('(', TokenType.LEFT_PAREN),
+        (')', TokenType.RIGHT_PAREN),
+        (',', TokenType.COMMA),
+        ('.', TokenType.DOT),
+        (':', TokenType.COLON),
+    ):
+        table[ord(text)] = (token_type, text)
+    for byte in _OP_TRIE:
+        table[byte] = Lexer._lex_operator
+    table[0] = Lexer._lex_eof
+    for byte in _LETTERS:
+        table[byte] = Lexer._lex_identifier
+    for byte in _DIGITS:
+        table[byte] = Lexer._lex_number
+    return table
+
+
+Lexer._DISPATCH = _build_dispatch_table()
 
 
 def test_lexer():
@@ -4,7 +4,6 @@ Python simulation of the KERN recursive descent parser to verify the implementat
 This simulates the Rust implementation to verify functionality.
 """
 
-from enum import Enum
 from typing import List, Optional, Union
 
 # AST Node definitions
@@ -65,65 +64,17 @@ class ConstraintDef(Definition):
         self.name = name
         self.condition = condition
 
-# Token types (matching the lexer)
-class TokenType(Enum):
-    # Keywords
-    ENTITY = "ENTITY"
-    RULE = "RULE"
-    FLOW = "FLOW"
-    CONSTRAINT = "CONSTRAINT"
-    IF = "IF"
-    THEN = "THEN"
-    ELSE = "ELSE"
-    LOOP = "LOOP"
-    BREAK = "BREAK"
-    HALT = "HALT"
-    AND = "AND"
-    OR = "OR"
-
-    # Identifiers and literals
-    IDENTIFIER = "IDENTIFIER"
-    NUMBER = "NUMBER"
-
-    # Symbols
-    COLON = "COLON"
-    COMMA = "COMMA"
-    DOT = "DOT"
-    LEFT_BRACE = "LEFT_BRACE"
-    RIGHT_BRACE = "RIGHT_BRACE"
-    LEFT_PAREN = "LEFT_PAREN"
-    RIGHT_PAREN = "RIGHT_PAREN"
-    EQUAL = "EQUAL"  # ==
-    NOT_EQUAL = "NOT_EQUAL"  # !=
-    GREATER = "GREATER"  # >
-    LESS = "LESS"  # <
-    GREATER_EQUAL = "GREATER_EQUAL"  # >=
-    LESS_EQUAL = "LESS_EQUAL"  # <=
-    ASSIGNMENT = "ASSIGNMENT"  # =
-
-    # Error
-    ILLEGAL = "ILLEGAL"
-
-    # Special
-    EOF = "EOF"
-
-class Token:
-    def __init__(self, token_type: TokenType, value=None, line=1, column=1, position=0):
-        self.token_type = token_type
-        self.value = value
-        self.line = line
-        self.column = column
-        self.position = position
-
-    def __repr__(self):
-        if self.value is not None:
-            return f"Token({self.token_type.value}, '{self.value}', line={self.line})"
-        return f"Token({self.token_type.value}, line={self.line})"
-
-# Import the lexer from the previous implementation
+# Import the lexer and token types from the previous implementation
+import os
 import sys
-sys.path.append("..\\kern-lexer")
-from test_lexer import Lexer, TokenType as LexerTokenType
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "kern-lexer"))
+from test_lexer import Lexer, TokenType
+
+# Tokens that can start a definition; error recovery resumes at these
+DEFINITION_START_TOKENS = frozenset({
+    TokenType.ENTITY, TokenType.RULE,
+    TokenType.FLOW, TokenType.CONSTRAINT,
+})
 
 class ParseError:
     def __init__(self, message: str, line: int, column: int, position: int):
@@ -138,21 +89,32 @@ class ParseError:
 class Parser:
     def __init__(self, input_text: str):
         self.lexer = Lexer(input_text)
-        self.current_token = self.lexer.next_token()
+        self.tokens = self.lexer.tokenize_all()
+        self._i = 0
+        self.current_token = self.tokens[0]
         self.errors = []
         self.recovery_enabled = True
+        self._DEF_DISPATCH = {
+            TokenType.ENTITY: self.parse_entity_def,
+            TokenType.RULE: self.parse_rule_def,
+            TokenType.FLOW: self.parse_flow_def,
+            TokenType.CONSTRAINT: self.parse_constraint_def,
+        }
 
     def next_token(self):
-        self.current_token = self.lexer.next_token()
+        # The stream ends at EOF; stay there once it has been reached
+        if self._i < len(self.tokens) - 1:
+            self._i += 1
+            self.current_token = self.tokens[self._i]
 
-    def expect_token(self, token_type: LexerTokenType):
+    def expect_token(self, token_type: TokenType):
         if self.current_token.token_type == token_type:
             token = self.current_token
             self.next_token()
             return token
         else:
             error = ParseError(
-                f"Expected {token_type}, got {self.current_token.token_type}",
+                f"Expected {token_type.name}, got {self.current_token.token_type.name}",
                 self.current_token.line,
                 self.current_token.column,
                 self.current_token.position
@@ -161,9 +123,9 @@ class Parser:
             raise error
 
     def is_at_end(self):
-        return self.current_token.token_type == LexerTokenType.EOF
+        return self.current_token.token_type == TokenType.EOF
 
-    def is_current_token(self, token_type: LexerTokenType):
+    def is_current_token(self, token_type: TokenType):
         return self.current_token.token_type == token_type
 
     def parse_program(self):
@@ -177,35 +139,26 @@ class Parser:
             except ParseError:
                 if self.recovery_enabled:
                     # Skip tokens until we find the start of another definition
-                    self.skip_until([LexerTokenType.ENTITY, LexerTokenType.RULE, 
-                                   LexerTokenType.FLOW, LexerTokenType.CONSTRAINT])
+                    self.skip_until(DEFINITION_START_TOKENS)
                 else:
                     break
         
         return Program(definitions)
 
     def skip_until(self, expected_tokens):
-        while not self.is_at_end():
-            for expected_token in expected_tokens:
-                if self.current_token.token_type == expected_token:
-                    return
+        while not self.is_at_end() and self.current_token.token_type not in expected_tokens:
             self.next_token()
 
     def parse_definition(self):
-        if self.is_current_token(LexerTokenType.ENTITY):
-            return self.parse_entity_def()
-        elif self.is_current_token(LexerTokenType.RULE):
-            return self.parse_rule_def()
-        elif self.is_current_token(LexerTokenType.FLOW):
-            return self.parse_flow_def()
-        elif self.is_current_token(LexerTokenType.CONSTRAINT):
-            return self.parse_constraint_def()
-        elif self.is_current_token(LexerTokenType.EOF):
+        parse_fn = self._DEF_DISPATCH.get(self.current_token.token_type)
+        if parse_fn:
+            return parse_fn()
+        elif self.is_current_token(TokenType.EOF):
             return None
         else:
             # Unexpected token
             error = ParseError(
-                f"Unexpected token {self.current_token.token_type}, expected a definition keyword",
+                f"Unexpected token {self.current_token.token_type.name}, expected a definition keyword",
                 self.current_token.line,
                 self.current_token.column,
                 self.current_token.position
@@ -215,42 +168,42 @@ class Parser:
             return None
 
     def parse_entity_def(self):
-        self.expect_token(LexerTokenType.ENTITY)
+        self.expect_token(TokenType.ENTITY)
         
         name = self.current_token.value
-        self.expect_token(LexerTokenType.IDENTIFIER)
+        self.expect_token(TokenType.IDENTIFIER)
         
-        self.expect_token(LexerTokenType.LEFT_BRACE)
+        self.expect_token(TokenType.LEFT_BRACE)
         
         fields = []
-        while not self.is_current_token(LexerTokenType.RIGHT_BRACE) and not self.is_at_end():
+        while not self.is_current_token(TokenType.RIGHT_BRACE) and not self.is_at_end():
             field = self.parse_field_def()
             if field:
                 fields.append(field)
         
-        self.expect_token(LexerTokenType.RIGHT_BRACE)
+        self.expect_token(TokenType.RIGHT_BRACE)
         
         return EntityDef(name, fields)
 
     def parse_field_def(self):
-        if self.is_current_token(LexerTokenType.IDENTIFIER):
+        if self.is_current_token(TokenType.IDENTIFIER):
             name = self.current_token.value
             self.next_token()  # consume identifier
             return FieldDef(name)
         return None
 
     def parse_rule_def(self):
-        self.expect_token(LexerTokenType.RULE)
+        self.expect_token(TokenType.RULE)
         
         name = self.current_token.value
-        self.expect_token(LexerTokenType.IDENTIFIER)
+        self.expect_token(TokenType.IDENTIFIER)
         
-        self.expect_token(LexerTokenType.COLON)
+        self.expect_token(TokenType.COLON)
         
-        self.expect_token(LexerTokenType.IF)
+        self.expect_token(TokenType.IF)
         condition = self.parse_condition()
         
-        self.expect_token(LexerTokenType.THEN)
+        self.expect_token(TokenType.THEN)
         actions = self.parse_action_list()
         
         return RuleDef(name, condition, actions)
@@ -272,7 +225,7 @@ class Parser:
             actions.append(action)
         
         # Parse additional actions separated by commas
-        while self.is_current_token(LexerTokenType.COMMA):
+        while self.is_current_token(TokenType.COMMA):
             self.next_token()  # consume comma
             action = self.parse_action()
             if action:
@@ -283,28 +236,28 @@ class Parser:
         return actions
 
     def parse_action(self):
-        if self.is_current_token(LexerTokenType.IDENTIFIER):
+        if self.is_current_token(TokenType.IDENTIFIER):
             # This could be a predicate call or assignment
             identifier = self.current_token.value
             self.next_token()
             
-            if self.is_current_token(LexerTokenType.LEFT_PAREN):
+            if self.is_current_token(TokenType.LEFT_PAREN):
                 # This is a predicate call
                 return self.parse_predicate()
             else:
                 # For simplicity in this simulation, return a basic action
                 return Action()
-        elif self.is_current_token(LexerTokenType.IF):
+        elif self.is_current_token(TokenType.IF):
             self.next_token()  # consume 'if'
             self.parse_condition()
-            self.expect_token(LexerTokenType.THEN)
+            self.expect_token(TokenType.THEN)
             then_actions = self.parse_action_list()
             else_actions = None
-            if self.is_current_token(LexerTokenType.ELSE):
+            if self.is_current_token(TokenType.ELSE):
                 self.next_token()  # consume 'else'
                 else_actions = self.parse_action_list()
             return Action()  # Simplified
-        elif self.is_current_token(LexerTokenType.HALT):
+        elif self.is_current_token(TokenType.HALT):
             self.next_token()  # consume 'halt'
             return Action()  # Simplified
         else:
@@ -312,47 +265,47 @@ class Parser:
 
     def parse_predicate(self):
         name = self.current_token.value
-        self.expect_token(LexerTokenType.IDENTIFIER)
-        self.expect_token(LexerTokenType.LEFT_PAREN)
+        self.expect_token(TokenType.IDENTIFIER)
+        self.expect_token(TokenType.LEFT_PAREN)
         
         arguments = []
-        if not self.is_current_token(LexerTokenType.RIGHT_PAREN):
+        if not self.is_current_token(TokenType.RIGHT_PAREN):
             # Parse first argument
-            if self.is_current_token(LexerTokenType.IDENTIFIER) or self.is_current_token(LexerTokenType.NUMBER):
+            if self.is_current_token(TokenType.IDENTIFIER) or self.is_current_token(TokenType.NUMBER):
                 # Simplified argument parsing
-                if self.is_current_token(LexerTokenType.IDENTIFIER):
+                if self.is_current_token(TokenType.IDENTIFIER):
                     arg_value = self.current_token.value
                     self.next_token()
-                elif self.is_current_token(LexerTokenType.NUMBER):
+                elif self.is_current_token(TokenType.NUMBER):
                     arg_value = self.current_token.value
                     self.next_token()
                 else:
                     arg_value = None
                 arguments.append(Term())  # Simplified
         
-        self.expect_token(LexerTokenType.RIGHT_PAREN)
+        self.expect_token(TokenType.RIGHT_PAREN)
         
         return Predicate(name, arguments)
 
     def parse_flow_def(self):
-        self.expect_token(LexerTokenType.FLOW)
+        self.expect_token(TokenType.FLOW)
         
         name = self.current_token.value
-        self.expect_token(LexerTokenType.IDENTIFIER)
+        self.expect_token(TokenType.IDENTIFIER)
         
-        self.expect_token(LexerTokenType.LEFT_BRACE)
+        self.expect_token(TokenType.LEFT_BRACE)
         actions = self.parse_action_list()
-        self.expect_token(LexerTokenType.RIGHT_BRACE)
+        self.expect_token(TokenType.RIGHT_BRACE)
         
         return FlowDef(name, actions)
 
     def parse_constraint_def(self):
-        self.expect_token(LexerTokenType.CONSTRAINT)
+        self.expect_token(TokenType.CONSTRAINT)
         
         name = self.current_token.value
-        self.expect_token(LexerTokenType.IDENTIFIER)
+        self.expect_token(TokenType.IDENTIFIER)
         
-        self.expect_token(LexerTokenType.COLON)
+        self.expect_token(TokenType.COLON)
         condition = self.parse_condition()
         
         return ConstraintDef(name, condition)
@@ -14,7 +14,10 @@ Requirements:
 - requests library
 """
 
+import asyncio
+import collections
 import json
+import re
 import subprocess
 import time
 from pathlib import Path
@@ -24,98 +27,161 @@ BRAIN_FILE = "psi/brain_extracted.json"
 LLM_ENDPOINT = "http://localhost:11434"  # Ollama default
 PSCLI_PATH = "tools/psi-cli/target/debug/psi_cli.exe"
 
-def test_scenario_1_list_operators():
+# Output lines the scenarios look for; matched once per line as psi-cli prints
+_MARKERS = re.compile(rb"Execution finished successfully|Available operators|Wrote language stub")
+
+# psi-cli runs per scenario: (batch file, batch commands, extra args, run options)
+# Scenario 2 stops at the language stub, the last thing `generate` writes
+SCENARIO_RUNS = {
+    1: ("demo/psi_scenario1.txt", "help\nlist operators\n", [], {}),
+    2: ("demo/psi_scenario2.txt", "generate login module in Rust\n", [],
+        {"stop_at": b"Wrote language stub"}),
+    3: ("demo/psi_scenario3.txt", "list operators\n", ["--llm-endpoint", LLM_ENDPOINT],
+        {"timeout": 10}),
+    5: ("demo/psi_scenario5.txt", """help
+list operators
+generate user management system
+""", [], {"tail_lines": 20}),
+}
+
+# `generate` writes demo/psi_generated.kern and output.kbc at fixed paths, so
+# the scenarios running it go one after another; the rest run alongside them
+SERIAL_SCENARIOS = (2, 5)
+
+async def run_psi(args, timeout=None, stop_at=None, tail_lines=None):
+    """Run psi-cli on the demo brain without blocking the event loop.
+    
+    stdout is consumed line by line as psi-cli prints it. Only the last
+    tail_lines lines are kept if given, and once a line contains stop_at
+    psi-cli is stopped rather than waited on. The _MARKERS seen along the
+    way are recorded on the result as `markers`.
+    
+    Output is kept as bytes; callers decode only what they print.
+    """
+    cmd = [PSCLI_PATH, "--load", BRAIN_FILE, *args]
+    proc = await asyncio.create_subprocess_exec(
+        *cmd,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE
+    )
+    lines = collections.deque(maxlen=tail_lines)
+    markers = set()
+    
+    async def read_stdout():
+        async for line in proc.stdout:
+            lines.append(line)
+            match = _MARKERS.search(line)
+            if match is None:
+                continue
+            markers.add(match.group())
+            if match.group() == stop_at:
+                try:
+                    proc.terminate()
+                except ProcessLookupError:
+                    pass  # already exited
+                return
+    
+    try:
+        _, stderr = await asyncio.wait_for(
+            asyncio.gather(read_stdout(), proc.stderr.read()), timeout
+        )
+        await proc.wait()
+    except asyncio.TimeoutError:
+        proc.kill()
+        await proc.wait()
+        raise subprocess.TimeoutExpired(cmd, timeout)
+    result = subprocess.CompletedProcess(cmd, proc.returncode, b"".join(lines), stderr)
+    result.markers = markers
+    return result
+
+async def run_scenario(number):
+    """Run one scenario's batch file through psi-cli"""
+    test_file, _, extra_args, options = SCENARIO_RUNS[number]
+    return await run_psi([*extra_args, "--batch", test_file], **options)
+
+async def run_serially(numbers):
+    """Run scenarios one at a time, keeping each one's result or error"""
+    runs = []
+    for number in numbers:
+        try:
+            runs.append(await run_scenario(number))
+        except Exception as e:
+            runs.append(e)
+    return runs
+
+async def run_all_scenarios():
+    """Write every batch file, then run the psi-cli scenarios, concurrently where safe"""
+    Path("demo").mkdir(exist_ok=True)
+    for test_file, test_commands, _, _ in SCENARIO_RUNS.values():
+        Path(test_file).write_text(test_commands)
+    
+    concurrent = [number for number in SCENARIO_RUNS if number not in SERIAL_SCENARIOS]
+    *runs, serial_runs = await asyncio.gather(
+        *(run_scenario(number) for number in concurrent),
+        run_serially(SERIAL_SCENARIOS),
+        return_exceptions=True
+    )
+    return {**dict(zip(concurrent, runs)), **dict(zip(SERIAL_SCENARIOS, serial_runs))}
+
+def finished(run):
+    """Return a scenario's completed run, re-raising the error if it failed"""
+    if isinstance(run, BaseException):
+        raise run
+    return run
+
+def test_scenario_1_list_operators(result):
     """Scenario 1: Load brain and list operators"""
     print("\n" + "="*60)
     print("SCENARIO 1: Load Brain and List Operators")
     print("="*60)
     
-    # Create test commands
-    test_commands = "help\nlist operators\n"
-    test_file = "demo/psi_scenario1.txt"
-    
-    with open(test_file, "w") as f:
-        f.write(test_commands)
-    
+    test_commands = SCENARIO_RUNS[1][1]
     print(f"\nTest commands:\n{test_commands}")
     
-    # Run psi-cli
-    cmd = [
-        PSCLI_PATH,
-        "--load", BRAIN_FILE,
-        "--batch", test_file
-    ]
-    
-    print(f"\nRunning: {' '.join(cmd)}\n")
-    result = subprocess.run(cmd, capture_output=True, text=True)
+    print(f"\nRunning: {' '.join(result.args)}\n")
     
     print("Output:")
-    print(result.stdout)
+    print(result.stdout.decode("utf-8", "replace"))
     if result.stderr:
-        print("Errors:", result.stderr)
+        print("Errors:", result.stderr.decode("utf-8", "replace"))
     
     return result.returncode == 0
 
-def test_scenario_2_generate_code():
+def test_scenario_2_generate_code(result):
     """Scenario 2: Generate code using brain operators"""
     print("\n" + "="*60)
     print("SCENARIO 2: Generate Code from Brain")
     print("="*60)
     
-    test_commands = "generate login module in Rust\n"
-    test_file = "demo/psi_scenario2.txt"
-    
-    with open(test_file, "w") as f:
-        f.write(test_commands)
-    
+    test_commands = SCENARIO_RUNS[2][1]
     print(f"\nTest command: {test_commands}")
     
-    cmd = [
-        PSCLI_PATH,
-        "--load", BRAIN_FILE,
-        "--batch", test_file
-    ]
-    
-    print(f"\nRunning: {' '.join(cmd)}\n")
-    result = subprocess.run(cmd, capture_output=True, text=True)
+    print(f"\nRunning: {' '.join(result.args)}\n")
     
     print("Output:")
-    print(result.stdout[-2000:] if len(result.stdout) > 2000 else result.stdout)
+    print(result.stdout[-2000:].decode("utf-8", "replace"))
     
-    return "Execution finished successfully" in result.stdout
+    return b"Execution finished successfully" in result.markers
 
-def test_scenario_3_with_llm_endpoint():
+def test_scenario_3_with_llm_endpoint(result):
     """Scenario 3: Test with LLM endpoint configured (dry run)"""
     print("\n" + "="*60)
     print("SCENARIO 3: PSI with LLM Endpoint Configured")
     print("="*60)
     
-    test_commands = "list operators\n"
-    test_file = "demo/psi_scenario3.txt"
-    
-    with open(test_file, "w") as f:
-        f.write(test_commands)
-    
+    test_commands = SCENARIO_RUNS[3][1]
     print(f"\nTest setup:")
     print(f"  Brain: {BRAIN_FILE}")
     print(f"  LLM Endpoint: {LLM_ENDPOINT}")
     print(f"  Commands: {test_commands.strip()}")
     
     # Try with LLM endpoint (won't actually fetch without --fetch-operators)
-    cmd = [
-        PSCLI_PATH,
-        "--load", BRAIN_FILE,
-        "--llm-endpoint", LLM_ENDPOINT,
-        "--batch", test_file
-    ]
-    
-    print(f"\nRunning: {' '.join(cmd)}\n")
-    result = subprocess.run(cmd, capture_output=True, text=True, timeout=10)
+    print(f"\nRunning: {' '.join(result.args)}\n")
     
     print("Output:")
-    print(result.stdout)
+    print(result.stdout.decode("utf-8", "replace"))
     
-    if "Available operators" in result.stdout:
+    if b"Available operators" in result.markers:
         print("\n✓ PSI successfully loaded brain and listed operators")
         return True
     
@@ -169,36 +235,21 @@ Interactive REPL Commands:
     print(instructions)
     return True
 
-def test_scenario_5_batch_workflow():
+def test_scenario_5_batch_workflow(result):
     """Scenario 5: Complete batch workflow"""
     print("\n" + "="*60)
     print("SCENARIO 5: Complete Batch Workflow")
     print("="*60)
     
-    test_commands = """help
-list operators
-generate user management system
-"""
-    test_file = "demo/psi_scenario5.txt"
-    
-    with open(test_file, "w") as f:
-        f.write(test_commands)
-    
+    test_commands = SCENARIO_RUNS[5][1]
     print(f"\nBatch commands:")
     for i, cmd in enumerate(test_commands.strip().split('\n'), 1):
         print(f"  {i}. {cmd}")
     
-    cmd = [
-        PSCLI_PATH,
-        "--load", BRAIN_FILE,
-        "--batch", test_file
-    ]
-    
     print(f"\nRunning batch workflow...\n")
-    result = subprocess.run(cmd, capture_output=True, text=True)
     
     # Check for successful completion
-    output_lines = result.stdout.split('\n')
+    output_lines = result.stdout.decode("utf-8", "replace").split('\n')
     print("Workflow Output:")
     for line in output_lines[-20:]:
         if line.strip():
@@ -223,13 +274,14 @@ def main():
     
     results = []
     
-    # Run test scenarios
+    # Run the psi-cli scenarios, then report on them in order
     try:
-        results.append(("Scenario 1: List Operators", test_scenario_1_list_operators()))
-        results.append(("Scenario 2: Generate Code", test_scenario_2_generate_code()))
-        results.append(("Scenario 3: With LLM Endpoint", test_scenario_3_with_llm_endpoint()))
+        runs = asyncio.run(run_all_scenarios())
+        results.append(("Scenario 1: List Operators", test_scenario_1_list_operators(finished(runs[1]))))
+        results.append(("Scenario 2: Generate Code", test_scenario_2_generate_code(finished(runs[2]))))
+        results.append(("Scenario 3: With LLM Endpoint", test_scenario_3_with_llm_endpoint(finished(runs[3]))))
         results.append(("Scenario 4: LLM Setup Instructions", test_scenario_4_llm_setup_instructions()))
-        results.append(("Scenario 5: Batch Workflow", test_scenario_5_batch_workflow()))
+        results.append(("Scenario 5: Batch Workflow", test_scenario_5_batch_workflow(finished(runs[5]))))
     except subprocess.TimeoutExpired:
         print("\n⏱️ Command timed out")
     except Exception as e:
@@ -0,0 +1,25 @@
+"""
+PSI brain (de)serialization shared by the extractor scripts.
+
+Needs only the standard library; orjson is used when it is installed.
+"""
+
+import json
+from typing import Any, Dict
+
+try:
+    import orjson  # optional: much faster brain (de)serialization
+except ImportError:
+    orjson = None
+
+
+def load_brain(data: bytes) -> Dict[str, Any]:
+    """Parse brain JSON bytes, using orjson when available."""
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+
+def dump_brain(brain: Dict[str, Any]) -> bytes:
+    """Serialize a brain as indented JSON, using orjson when available."""
+    if orjson is not None:
+        return orjson.dumps(brain, option=orjson.OPT_INDENT_2)
+    return json.dumps(brain, indent=2).encode()
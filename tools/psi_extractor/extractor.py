@@ -8,12 +8,109 @@ and normalizes them into PSI brain format (JSON).
 
 import json
 import argparse
+import hashlib
+import os
 import requests
 import sys
-from typing import Dict, List, Any, Optional
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Any, Optional
+
+from brain_io import dump_brain
+
+# Upper bound on concurrent per-domain LLM queries
+MAX_PARALLEL_QUERIES = 8
+
+# Default location of the on-disk LLM response cache
+CACHE_DIR = Path.home() / ".cache" / "psi_extractor"
+
+# Shared decoder for LLM output; JSONDecoder keeps no per-call state, so
+# the query threads can all use it
+_DECODER = json.JSONDecoder()
+
+
+# Prompt templates, filled in with str.format (literal braces are doubled)
+OPERATOR_PROMPT_TEMPLATE = """You are an expert system designer. Extract 3 atomic operators for the '{domain}' domain.
+For each operator, provide a JSON object with:
+- "name": operator name (e.g., "ParseCode", "TranslateText")
+- "description": brief description
+- "kern_template": a short KERN rule that represents this operator's logic
+- "emissions": dict with "rust" and "python" emission templates
+
+Return a JSON array of operator objects. Example format:
+[
+  {{
+    "name": "ParseCode",
+    "description": "Parse code and extract AST",
+    "kern_template": "rule ParseCode: if 1 == 1 then log(\\"code parsed\\")",
+    "emissions": {{
+      "rust": "// parse code using tree-sitter",
+      "python": "# parse code using ast module"
+    }}
+  }}
+]
+
+Be deterministic and concise. Output ONLY valid JSON."""
+
+METAPROGRAM_PROMPT_TEMPLATE = """You are an expert system designer. Given these operators: {op_names}
+
+Propose 2 meta-programs (operator chains) that combine them for practical tasks.
+Return a JSON array with objects:
+- "name": meta-program name (e.g., "GenerateAPI")
+- "operators": list of operator names in sequence
+- "description": brief description
+
+Example:
+[
+  {{
+    "name": "GenerateAPI",
+    "operators": ["ParseCode", "TranslateText", "GenerateCode"],
+    "description": "Generate REST API from specification"
+  }}
+]
+
+Output ONLY valid JSON."""
+
+
+class JsonArrayScanner:
+    """Incrementally finds where the first JSON array in streamed text ends."""
+    
+    def __init__(self):
+        self.started = False
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+    
+    def feed(self, text: str) -> bool:
+        """Consume the next chunk; return True once the first array has closed."""
+        for ch in text:
+            if not self.started:
+                # Same starting point as _decode_json_array: the first '['
+                if ch == "[":
+                    self.started = True
+                    self.depth = 1
+            elif self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif ch == "\\":
+                    self.escaped = True
+                elif ch == '"':
+                    self.in_string = False
+            elif ch == '"':
+                self.in_string = True
+            elif ch in "[{":
+                self.depth += 1
+            elif ch in "]}":
+                self.depth -= 1
+                if self.depth == 0:
+                    return True
+        return False
+
 
 class LLMExtractor:
-    def __init__(self, endpoint: str, model: str, api_type: str = "ollama"):
+    def __init__(self, endpoint: str, model: str, api_type: str = "ollama",
+                 cache_dir: Optional[Path] = CACHE_DIR, refresh_cache: bool = False):
         """
         Initialize extractor.
         
@@ -21,45 +118,111 @@ class LLMExtractor:
             endpoint: LLM API endpoint (e.g., http://localhost:11434/api/generate)
             model: model name to query
             api_type: 'ollama', 'openai', or 'vllm'
+            cache_dir: directory for cached LLM responses (None disables caching)
+            refresh_cache: always query the LLM, overwriting cached responses
         """
         self.endpoint = endpoint
         self.model = model
         self.api_type = api_type
+        self.cache_dir = cache_dir
+        self.refresh_cache = refresh_cache
+        
+        # Keep-alive connection pool shared by all queries (and query threads)
+        self._session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=MAX_PARALLEL_QUERIES)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
     
     def query_ollama(self, prompt: str) -> Optional[str]:
-        """Query Ollama API."""
+        """Query Ollama API, streaming the generated text."""
         try:
-            resp = requests.post(
+            with self._session.post(
                 self.endpoint,
-                json={"model": self.model, "prompt": prompt, "stream": False},
+                json={"model": self.model, "prompt": prompt, "stream": True},
+                stream=True,
                 timeout=120
-            )
-            resp.raise_for_status()
-            return resp.json().get("response", "")
+            ) as resp:
+                resp.raise_for_status()
+                chunks = (_DECODER.decode(line.decode()).get("response", "") for line in resp.iter_lines() if line)
+                return self._collect_stream(chunks)
         except Exception as e:
             print(f"Ollama query failed: {e}", file=sys.stderr)
             return None
     
     def query_openai_api(self, prompt: str) -> Optional[str]:
-        """Query OpenAI-compatible API (LM Studio, vLLM)."""
+        """Query OpenAI-compatible API (LM Studio, vLLM), streaming the reply."""
         try:
-            resp = requests.post(
+            with self._session.post(
                 self.endpoint,
                 json={
                     "model": self.model,
                     "messages": [{"role": "user", "content": prompt}],
-                    "temperature": 0.1
+                    "temperature": 0.1,
+                    "stream": True
                 },
+                stream=True,
                 timeout=120
-            )
-            resp.raise_for_status()
-            return resp.json()["choices"][0]["message"]["content"]
+            ) as resp:
+                resp.raise_for_status()
+                return self._collect_stream(self._sse_content(resp))
         except Exception as e:
             print(f"OpenAI API query failed: {e}", file=sys.stderr)
             return None
     
+    @staticmethod
+    def _sse_content(resp) -> Iterator[str]:
+        """Yield the content deltas of an OpenAI-style server-sent event stream."""
+        for line in resp.iter_lines():
+            if not line.startswith(b"data: "):
+                continue
+            data = line[len(b"data: "):]
+            if data.strip() == b"[DONE]":
+                return
+            choices = _DECODER.decode(data.decode()).get("choices") or [{}]
+            yield (choices[0].get("delta") or {}).get("content") or ""
+    
+    @staticmethod
+    def _collect_stream(chunks: Iterable[str]) -> str:
+        """Join streamed text, stopping as soon as the first JSON array is complete.
+        
+        Only that array is ever parsed, so anything the model generates after
+        it is not waited for.
+        """
+        scanner = JsonArrayScanner()
+        parts = []
+        for chunk in chunks:
+            parts.append(chunk)
+            if scanner.feed(chunk):
+                break
+        return "".join(parts)
+    
     def query(self, prompt: str) -> Optional[str]:
-        """Query LLM with the given prompt."""
+        """Query LLM with the given prompt, reusing a cached response if any."""
+        cache_path = self._cache_path(prompt)
+        if cache_path is not None and not self.refresh_cache and cache_path.exists():
+            try:
+                return json.loads(cache_path.read_text(encoding="utf-8"))["response"]
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Ignoring unreadable cache entry {cache_path}: {e}", file=sys.stderr)
+        
+        response = self._query_backend(prompt)
+        if response and cache_path is not None and self._has_json_array(response):
+            self._write_cache(cache_path, response)
+        return response
+    
+    def _has_json_array(self, response: str) -> bool:
+        """Whether a response holds a non-empty JSON array, i.e. is worth caching.
+        
+        Prose without an array, or an answer cut off by a dropped stream, is
+        not cached, so the next run asks the LLM again.
+        """
+        try:
+            return bool(self._decode_json_array(response))
+        except json.JSONDecodeError:
+            return False
+    
+    def _query_backend(self, prompt: str) -> Optional[str]:
+        """Send the prompt to the configured LLM API."""
         if self.api_type == "ollama":
             return self.query_ollama(prompt)
         elif self.api_type in ["openai", "vllm", "lm-studio"]:
@@ -68,6 +231,24 @@ class LLMExtractor:
             print(f"Unknown API type: {self.api_type}", file=sys.stderr)
             return None
     
+    def _cache_path(self, prompt: str) -> Optional[Path]:
+        """Cache file for a prompt, keyed by endpoint, model, API type and prompt text."""
+        if self.cache_dir is None:
+            return None
+        key = hashlib.sha256(f"{self.endpoint}|{self.model}|{self.api_type}|{prompt}".encode()).hexdigest()
+        return Path(self.cache_dir) / f"{key}.json"
+    
+    def _write_cache(self, cache_path: Path, response: str) -> None:
+        """Store a response atomically so concurrent queries never see partial files."""
+        try:
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            with tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=cache_path.parent,
+                                             suffix=".tmp", delete=False) as f:
+                json.dump({"response": response}, f)
+            os.replace(f.name, cache_path)
+        except OSError as e:
+            print(f"Failed to cache LLM response: {e}", file=sys.stderr)
+    
     def extract_operators(self, domains: List[str]) -> Dict[str, Any]:
         """
         Extract operator definitions for given domains.
@@ -78,13 +259,48 @@ class LLMExtractor:
         Returns:
             dict with "operators", "meta_programs", "heuristics" keys
         """
-        operators = []
-        meta_programs = []
+        # Domains are independent, so query the LLM for all of them at once
+        # and consume the responses in the original domain order
+        workers = max(1, min(MAX_PARALLEL_QUERIES, len(domains)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            pending = []
+            for domain in domains:
+                print(f"Extracting {domain} operators...", file=sys.stderr)
+                prompt = self._make_operator_prompt(domain)
+                pending.append((domain, executor.submit(self.query, prompt)))
+            responses = {domain: future.result() for domain, future in pending}
         
-        for domain in domains:
-            print(f"Extracting {domain} operators...", file=sys.stderr)
-            prompt = self._make_operator_prompt(domain)
-            response = self.query(prompt)
+        operators = self._parse_operators(responses)
+        op_names = [op["name"] for op in operators]
+        
+        # Extract meta-programs
+        meta_response = None
+        if operators:
+            print("Extracting meta-programs...", file=sys.stderr)
+            prompt = self._make_metaprogram_prompt(op_names)
+            meta_response = self.query(prompt)
+        
+        return self._assemble(operators, op_names, meta_response)
+    
+    def extract_from_responses(self, operator_responses: Dict[str, Optional[str]],
+                               meta_response: Optional[str]) -> Dict[str, Any]:
+        """
+        Build a brain from raw LLM responses without querying the LLM.
+        
+        Args:
+            operator_responses: operator response text per domain, in domain order
+            meta_response: meta-program response text, or None
+        
+        Returns:
+            dict with "operators", "meta_programs", "heuristics" keys
+        """
+        operators = self._parse_operators(operator_responses)
+        return self._assemble(operators, [op["name"] for op in operators], meta_response)
+    
+    def _parse_operators(self, operator_responses: Dict[str, Optional[str]]) -> List[Dict]:
+        """Parse and normalize the operator responses of every domain."""
+        operators = []
+        for domain, response in operator_responses.items():
             if not response:
                 print(f"Failed to extract {domain} operators", file=sys.stderr)
                 continue
@@ -93,112 +309,76 @@ class LLMExtractor:
             ops = self._parse_operator_response(response, domain)
             if ops:
                 operators.extend(ops)
-        
-        # Extract meta-programs
-        if operators:
-            print("Extracting meta-programs...", file=sys.stderr)
-            prompt = self._make_metaprogram_prompt(operators)
-            response = self.query(prompt)
-            if response:
-                mps = self._parse_metaprogram_response(response)
-                if mps:
-                    meta_programs.extend(mps)
+        return operators
+    
+    def _assemble(self, operators: List[Dict], op_names: List[str],
+                  meta_response: Optional[str]) -> Dict[str, Any]:
+        """Combine parsed operators and the meta-program response into a brain."""
+        meta_programs = []
+        if operators and meta_response:
+            mps = self._parse_metaprogram_response(meta_response)
+            if mps:
+                meta_programs.extend(mps)
         
         return {
             "name": "extracted-psi",
             "operators": operators,
             "meta_programs": meta_programs if meta_programs else [
-                {"name": "GenerateModule", "operators": [op["name"] for op in operators[:4]]}
+                {"name": "GenerateModule", "operators": op_names[:4]}
             ],
             "heuristics": self._default_heuristics(operators)
         }
     
     def _make_operator_prompt(self, domain: str) -> str:
         """Generate prompt to extract operators for a domain."""
-        return f"""You are an expert system designer. Extract 3 atomic operators for the '{domain}' domain.
-For each operator, provide a JSON object with:
-- "name": operator name (e.g., "ParseCode", "TranslateText")
-- "description": brief description
-- "kern_template": a short KERN rule that represents this operator's logic
-- "emissions": dict with "rust" and "python" emission templates
-
-Return a JSON array of operator objects. Example format:
-[
-  {{
-    "name": "ParseCode",
-    "description": "Parse code and extract AST",
-    "kern_template": "rule ParseCode: if 1 == 1 then log(\\"code parsed\\")",
-    "emissions": {{
-      "rust": "// parse code using tree-sitter",
-      "python": "# parse code using ast module"
-    }}
-  }}
-]
-
-Be deterministic and concise. Output ONLY valid JSON."""
+        return OPERATOR_PROMPT_TEMPLATE.format(domain=domain)
     
-    def _make_metaprogram_prompt(self, operators: List[Dict]) -> str:
+    def _make_metaprogram_prompt(self, op_names: List[str]) -> str:
         """Generate prompt to extract meta-programs."""
-        op_names = [op["name"] for op in operators]
-        return f"""You are an expert system designer. Given these operators: {op_names}
-
-Propose 2 meta-programs (operator chains) that combine them for practical tasks.
-Return a JSON array with objects:
-- "name": meta-program name (e.g., "GenerateAPI")
-- "operators": list of operator names in sequence
-- "description": brief description
-
-Example:
-[
-  {{
-    "name": "GenerateAPI",
-    "operators": ["ParseCode", "TranslateText", "GenerateCode"],
-    "description": "Generate REST API from specification"
-  }}
-]
-
-Output ONLY valid JSON."""
+        return METAPROGRAM_PROMPT_TEMPLATE.format(op_names=op_names)
     
     def _parse_operator_response(self, response: str, domain: str) -> List[Dict]:
         """Parse operator JSON from LLM response."""
         try:
-            # Try to extract JSON from response
-            start = response.find("[")
-            end = response.rfind("]") + 1
-            if start >= 0 and end > start:
-                json_str = response[start:end]
-                ops = json.loads(json_str)
-                
-                # Normalize and validate
-                normalized = []
-                for op in ops:
-                    if isinstance(op, dict) and "name" in op:
-                        op["domain"] = domain
-                        op.setdefault("kern_template", f'rule {op["name"]}: if 1 == 1 then log("{op["name"]} done")')
-                        op.setdefault("emissions", {"rust": f"// {op['name']}", "python": f"# {op['name']}"})
-                        normalized.append(op)
-                return normalized
+            ops = self._decode_json_array(response)
         except json.JSONDecodeError as e:
             print(f"Failed to parse JSON from response: {e}", file=sys.stderr)
-        return []
+            return []
+        
+        # Normalize and validate
+        return [self._normalize_op(op, domain) for op in ops if isinstance(op, dict) and "name" in op]
+    
+    def _normalize_op(self, op: Dict, domain: str) -> Dict:
+        """Tag an operator with its domain and fill in missing templates."""
+        op["domain"] = domain
+        # Defaults are only formatted when the LLM left the field out
+        if "kern_template" not in op:
+            op["kern_template"] = f'rule {op["name"]}: if 1 == 1 then log("{op["name"]} done")'
+        if "emissions" not in op:
+            op["emissions"] = {"rust": f"// {op['name']}", "python": f"# {op['name']}"}
+        return op
     
     def _parse_metaprogram_response(self, response: str) -> List[Dict]:
         """Parse meta-program JSON from LLM response."""
         try:
-            start = response.find("[")
-            end = response.rfind("]") + 1
-            if start >= 0 and end > start:
-                json_str = response[start:end]
-                return json.loads(json_str)
+            return self._decode_json_array(response)
         except json.JSONDecodeError:
-            pass
-        return []
+            return []
+    
+    def _decode_json_array(self, response: str) -> List[Any]:
+        """Decode the first JSON array in an LLM response in a single pass."""
+        # raw_decode stops at the end of the array, so trailing prose (even
+        # with brackets in it) is never scanned or sliced off
+        start = response.find("[")
+        if start < 0:
+            return []
+        value, _ = _DECODER.raw_decode(response, start)
+        return value
     
     def _default_heuristics(self, operators: List[Dict]) -> List[Dict]:
         """Generate default heuristics for operators."""
-        weights = {}
-        for i, op in enumerate(operators):
-            weights[op["name"]] = max(1, 10 - i)  # descending priority
+        # Descending priority, clamped at 1 from the tenth operator on
+        weights = {op["name"]: 10 - i if i < 9 else 1 for i, op in enumerate(operators)}
         
         return [{
             "name": "default",
@@ -212,21 +392,31 @@ def main():
     parser.add_argument("--model", required=True, help="Model name")
     parser.add_argument("--api-type", default="ollama", choices=["ollama", "openai", "vllm", "lm-studio"],
                         help="API type")
-    parser.add_argument("--output", default="psi/brain.json", help="Output brain JSON file")
+    parser.add_argument("--output", default="psi/brain.json", help="Output brain JSON file ('-' for stdout)")
     parser.add_argument("--domains", default="code,text", help="Domains to extract (comma-separated)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help=f"Always query the LLM, refreshing the responses cached in {CACHE_DIR}")
     
     args = parser.parse_args()
     
-    extractor = LLMExtractor(args.endpoint, args.model, args.api_type)
+    extractor = LLMExtractor(args.endpoint, args.model, args.api_type,
+                             refresh_cache=args.no_cache)
     domains = args.domains.split(",")
     
     print(f"Querying {args.api_type} at {args.endpoint} with model {args.model}...", file=sys.stderr)
     brain = extractor.extract_operators(domains)
     
+    if args.output == "-":
+        sys.stdout.buffer.write(dump_brain(brain))
+        sys.stdout.flush()
+        print(f"Extracted {len(brain['operators'])} operators, {len(brain['meta_programs'])} meta-programs",
+              file=sys.stderr)
+        return
+    
     # Save to file
     try:
-        with open(args.output, "w") as f:
-            json.dump(brain, f, indent=2)
+        with open(args.output, "wb") as f:
+            f.write(dump_brain(brain))
         print(f"Saved brain to {args.output}", file=sys.stderr)
         print(f"Extracted {len(brain['operators'])} operators, {len(brain['meta_programs'])} meta-programs")
     except Exception as e:
@@ -4,28 +4,59 @@ Quick setup and extraction script for PSI operators.
 Guides user through Ollama setup and runs extraction.
 """
 
+import argparse
+import hashlib
 import subprocess
 import sys
 import os
-import json
 import time
 from pathlib import Path
 
-def check_ollama_running():
+from brain_io import load_brain
+
+OLLAMA_TAGS_URL = "http://localhost:11434/api/tags"
+
+# Pause after each failed readiness probe (about 27s in total)
+READY_PROBE_DELAYS = [0.05, 0.1, 0.2, 0.5, 1, 1, 2, 2, 5, 5, 10]
+
+def extraction_digest(model, api_type, domains, extractor_source):
+    """Digest of the extraction inputs, stored next to the brain as a .hash file.
+    
+    The extractor's source is part of it, since its prompts shape the brain.
+    """
+    key = f"{model}|{api_type}|{','.join(sorted(domains))}|".encode() + extractor_source
+    return hashlib.blake2b(key, digest_size=8).hexdigest()
+
+def check_ollama_running(session=None, timeout=2):
     """Check if Ollama is running."""
     try:
         import requests
-        resp = requests.get("http://localhost:11434/api/tags", timeout=2)
+        resp = (session or requests).get(OLLAMA_TAGS_URL, timeout=timeout)
         return resp.status_code == 200
     except Exception:
         return False
 
+def wait_for_ollama():
+    """Probe Ollama with exponential backoff over one keep-alive session."""
+    import requests
+    with requests.Session() as session:
+        for delay in READY_PROBE_DELAYS:
+            if check_ollama_running(session, timeout=1):
+                return True
+            time.sleep(delay)
+        return check_ollama_running(session, timeout=1)
+
 def print_section(title):
     print(f"\n{'='*60}")
     print(f"  {title}")
     print(f"{'='*60}\n")
 
 def main():
+    parser = argparse.ArgumentParser(description="Set up Ollama and extract PSI operators")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Re-extract even if the brain is up to date, without cached LLM responses")
+    args = parser.parse_args()
+    
     print_section("PSI Operator Extraction Setup")
     
     # Step 1: Check/start Ollama
@@ -43,11 +74,8 @@ def main():
             sys.exit(1)
         
         print("Waiting for Ollama to be ready...")
-        for i in range(30):
-            if check_ollama_running():
-                print("✓ Ollama is now running!")
-                break
-            time.sleep(1)
+        if wait_for_ollama():
+            print("✓ Ollama is now running!")
         else:
             print("✗ Ollama did not start in time.")
             sys.exit(1)
@@ -56,7 +84,7 @@ def main():
     print("\nStep 2: Checking for models...")
     try:
         import requests
-        resp = requests.get("http://localhost:11434/api/tags")
+        resp = requests.get(OLLAMA_TAGS_URL)
         data = resp.json()
         models = data.get("models", [])
         if models:
@@ -75,53 +103,75 @@ def main():
     
     # Step 3: Run extraction
     print_section("Running Operator Extraction")
-    print(f"Extracting operators from Ollama (model: {model})...\n")
     
     extractor_path = Path(__file__).parent / "extractor.py"
     output_path = Path(__file__).parent.parent.parent / "psi" / "brain_llm_extracted.json"
+    hash_path = output_path.with_suffix(".hash")
+    domains = "code,text"
     
-    cmd = [
-        sys.executable,
-        str(extractor_path),
-        "--endpoint", "http://localhost:11434/api/generate",
-        "--model", model,
-        "--domains", "code,text",
-        "--output", str(output_path)
-    ]
-    
-    print(f"Command: {' '.join(cmd)}\n")
-    result = subprocess.run(cmd, capture_output=False)
-    
-    if result.returncode == 0:
+    # The brain only depends on what is queried; skip the LLM when that has
+    # not changed, unless the cached brain came out without operators
+    digest = extraction_digest(model, "ollama", domains.split(","), extractor_path.read_bytes())
+    brain = None
+    if (not args.no_cache and output_path.exists() and hash_path.exists()
+            and hash_path.read_text().strip() == digest):
+        brain = load_brain(output_path.read_bytes())
+    if brain and brain.get('operators'):
+        print(f"✓ {output_path} is up to date for model {model} (cached)\n")
+    else:
+        print(f"Extracting operators from Ollama (model: {model})...\n")
+        
+        cmd = [
+            sys.executable,
+            str(extractor_path),
+            "--endpoint", "http://localhost:11434/api/generate",
+            "--model", model,
+            "--domains", domains,
+            "--output", "-"
+        ]
+        if args.no_cache:
+            cmd.append("--no-cache")
+        
+        print(f"Command: {' '.join(cmd)}\n")
+        # The brain comes back on stdout; progress and errors still reach the terminal on stderr
+        result = subprocess.run(cmd, stdout=subprocess.PIPE)
+        
+        if result.returncode != 0:
+            print("✗ Extraction failed. Check the error above.")
+            sys.exit(1)
+        
+        output_path.write_bytes(result.stdout)
+        brain = load_brain(result.stdout) if result.stdout else None
+        # The extractor exits 0 even when every query failed; only a brain
+        # with operators is marked up to date
+        if brain and brain.get('operators'):
+            hash_path.write_text(digest)
+        else:
+            hash_path.unlink(missing_ok=True)
+            print("✗ No operators were extracted; they will be queried again next run.")
         print_section("Extraction Complete!")
         print(f"✓ Brain saved to: {output_path}\n")
+    
+    # Display summary
+    if brain:
+        print(f"Brain summary:")
+        print(f"  Name: {brain.get('name')}")
+        print(f"  Operators: {len(brain.get('operators', []))}")
+        print(f"  Meta-programs: {len(brain.get('meta_programs', []))}")
         
-        # Load and display summary
-        if output_path.exists():
-            with open(output_path) as f:
-                brain = json.load(f)
-            
-            print(f"Brain summary:")
-            print(f"  Name: {brain.get('name')}")
-            print(f"  Operators: {len(brain.get('operators', []))}")
-            print(f"  Meta-programs: {len(brain.get('meta_programs', []))}")
-            
-            if brain.get('operators'):
-                print(f"\n  Extracted operators:")
-                for op in brain['operators']:
-                    print(f"    - {op.get('name')}: {op.get('description', 'N/A')}")
-            
-            # Next steps
-            print_section("Next Steps")
-            print("1. Use the extracted brain in PSI CLI:")
-            print(f"   cargo run --manifest-path tools/psi-cli/Cargo.toml -- --load psi/brain_llm_extracted.json --interactive\n")
-            print("2. Or run a batch task:")
-            print(f"   cargo run --manifest-path tools/psi-cli/Cargo.toml -- --load psi/brain_llm_extracted.json --batch demo/psi_tasks.txt\n")
-            print("3. Or verify operators compile:")
-            print(f"   python tools/psi_extractor/verify_operators.py --brain {output_path}\n")
-    else:
-        print("✗ Extraction failed. Check the error above.")
-        sys.exit(1)
+        if brain.get('operators'):
+            print(f"\n  Extracted operators:")
+            for op in brain['operators']:
+                print(f"    - {op.get('name')}: {op.get('description', 'N/A')}")
+        
+        # Next steps
+        print_section("Next Steps")
+        print("1. Use the extracted brain in PSI CLI:")
+        print(f"   cargo run --manifest-path tools/psi-cli/Cargo.toml -- --load psi/brain_llm_extracted.json --interactive\n")
+        print("2. Or run a batch task:")
+        print(f"   cargo run --manifest-path tools/psi-cli/Cargo.toml -- --load psi/brain_llm_extracted.json --batch demo/psi_tasks.txt\n")
+        print("3. Or verify operators compile:")
+        print(f"   python tools/psi_extractor/verify_operators.py --brain {output_path}\n")
 
 if __name__ == "__main__":
     main()
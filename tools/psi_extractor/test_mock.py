@@ -1,49 +1,43 @@
 #!/usr/bin/env python3
 """
-Quick test of the extractor with a mock LLM response.
+Quick test of the extractor with mock LLM responses.
 """
 
 import json
 from extractor import LLMExtractor
 
-class MockExtractor(LLMExtractor):
-    """Mock extractor that returns pre-defined operators without calling an LLM."""
-    
-    def query(self, prompt):
-        """Return a mock response based on prompt content."""
-        if "operators" in prompt.lower():
-            return json.dumps([
-                {
-                    "name": "ParseCode",
-                    "description": "Parse code into AST",
-                    "kern_template": 'rule ParseCode: if 1 == 1 then log("code parsed")',
-                    "emissions": {
-                        "rust": "// parse code",
-                        "python": "# parse code"
-                    }
-                },
-                {
-                    "name": "GenerateCode",
-                    "description": "Generate code from spec",
-                    "kern_template": 'rule GenerateCode: if 1 == 1 then log("code generated")',
-                    "emissions": {
-                        "rust": "// generate code",
-                        "python": "# generate code"
-                    }
-                }
-            ])
-        elif "meta" in prompt.lower():
-            return json.dumps([
-                {
-                    "name": "CodeTransform",
-                    "operators": ["ParseCode", "GenerateCode"],
-                    "description": "Transform code"
-                }
-            ])
-        return "[]"
+# Pre-defined LLM responses, fed straight into the parse stage
+MOCK_OPERATOR_RESPONSE = json.dumps([
+    {
+        "name": "ParseCode",
+        "description": "Parse code into AST",
+        "kern_template": 'rule ParseCode: if 1 == 1 then log("code parsed")',
+        "emissions": {
+            "rust": "// parse code",
+            "python": "# parse code"
+        }
+    },
+    {
+        "name": "GenerateCode",
+        "description": "Generate code from spec",
+        "kern_template": 'rule GenerateCode: if 1 == 1 then log("code generated")',
+        "emissions": {
+            "rust": "// generate code",
+            "python": "# generate code"
+        }
+    }
+])
+
+MOCK_METAPROGRAM_RESPONSE = json.dumps([
+    {
+        "name": "CodeTransform",
+        "operators": ["ParseCode", "GenerateCode"],
+        "description": "Transform code"
+    }
+])
 
 if __name__ == "__main__":
-    extractor = MockExtractor("http://localhost:11434/api/generate", "mistral")
-    brain = extractor.extract_operators(["code"])
-    
+    extractor = LLMExtractor("http://localhost:11434/api/generate", "mistral")
+    brain = extractor.extract_from_responses({"code": MOCK_OPERATOR_RESPONSE}, MOCK_METAPROGRAM_RESPONSE)
+
     print(json.dumps(brain, indent=2))
@@ -6,95 +6,417 @@ Converts extracted operators into KERN fragments, compiles and runs them
 on the kern-vm to verify deterministic behavior.
 """
 
+import asyncio
+import errno
+import functools
+import hashlib
 import json
 import subprocess
 import sys
 import os
-from typing import Dict, List, Any, Optional
+import shlex
+import shutil
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Any, Optional, Tuple
+
+from brain_io import load_brain
+
+# Scratch space for KERN sources and bytecode; /dev/shm keeps them in RAM
+SCRATCH_DIR = "/dev/shm" if os.path.isdir("/dev/shm") else None
+
+# Most buffers a single os.writev call accepts
+_IOV_MAX = os.sysconf("SC_IOV_MAX") if hasattr(os, "sysconf") else 1024
+
+# Default location of the compiled bytecode and run output cache
+CACHE_DIR = Path.home() / ".cache" / "psi_verifier"
+
+# Fallback when kernc cannot be built up front
+_CARGO_RUN = "cargo run --package kern_compiler_cli --bin kernc --"
+
+
+def _write_source(path: str, parts: List[str]) -> None:
+    """Write a fresh KERN source file from its parts with raw, vectored writes.
+    
+    The parts are written back to back without being joined first, and no
+    text-mode file object is involved. Short writes are resumed, so the
+    source is either complete or an OSError is raised.
+    """
+    buffers = [memoryview(part.encode("utf-8")) for part in parts if part]
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    try:
+        i = 0
+        while i < len(buffers):
+            if hasattr(os, "writev"):
+                written = os.writev(fd, buffers[i:i + _IOV_MAX])
+            else:
+                written = os.write(fd, buffers[i])
+            if written == 0:
+                raise OSError(errno.ENOSPC, "No bytes written", path)
+            # Skip the buffers written in full; a short write resumes mid-buffer
+            while i < len(buffers) and written >= len(buffers[i]):
+                written -= len(buffers[i])
+                i += 1
+            if written:
+                buffers[i] = buffers[i][written:]
+    finally:
+        os.close(fd)
+
+
+async def _run_kernc(compiler_argv: List[str], args: List[str], timeout: float = 30,
+                     capture_stdout: bool = False) -> Tuple[int, Optional[bytes], bytes]:
+    """Run kernc without blocking the event loop.
+    
+    Return its exit code, its stdout (None unless capture_stdout) and its stderr.
+    """
+    cmd = [*compiler_argv, *args]
+    proc = await asyncio.create_subprocess_exec(
+        *cmd,
+        stdout=asyncio.subprocess.PIPE if capture_stdout else asyncio.subprocess.DEVNULL,
+        stderr=asyncio.subprocess.PIPE,
+        close_fds=False  # allows posix_spawn
+    )
+    try:
+        stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout)
+    except asyncio.TimeoutError:
+        proc.kill()
+        await proc.wait()
+        raise subprocess.TimeoutExpired(cmd, timeout)
+    return proc.returncode, stdout, stderr
+
+
+@functools.lru_cache(maxsize=None)
+def _kernc_identity(kernc: str) -> str:
+    """Identify the kernc build at the given path, for the cache keys.
+    
+    Rebuilding kernc changes the binary's size or modification time, so
+    bytecode and run output of another build are never reused.
+    """
+    path = os.path.realpath(kernc)
+    try:
+        st = os.stat(path)
+        stamp = f"{st.st_size}:{st.st_mtime_ns}"
+    except OSError:
+        stamp = ""
+    return f"{path}\0{stamp}"
+
+
+@functools.lru_cache(maxsize=None)
+def _warn_cache_unwritable(cache_dir: Path, reason: str) -> None:
+    """Report a cache write failure, once per cache directory and reason."""
+    print(f"Cannot write the verifier cache in {cache_dir} ({reason}); continuing without it",
+          file=sys.stderr)
+
+
+async def _build_and_run(compiler_argv: List[str], kern_parts: List[str], name: Optional[str] = None,
+                         cache_dir: Optional[Path] = None, log: Optional[List[str]] = None,
+                         execute: bool = True, refresh: bool = False) -> bool:
+    """Compile KERN source with kernc and run the bytecode. Return True if both succeed.
+    
+    The source is kern_parts, each ended by a newline; with execute=False
+    it is only compiled.
+    
+    Progress and failures are appended to `log` under `name`; without a log
+    the check is silent. Each call works in its own temp directory, so
+    concurrent calls never share source or bytecode files.
+    
+    With a cache_dir, the bytecode is kept there under the digest of the
+    source and the kernc build, and unchanged sources are never recompiled.
+    The digest of what each run prints is kept too, and a run whose output
+    differs from an earlier one fails as nondeterministic. With refresh,
+    everything is recompiled and rerun and the cache entries are replaced.
+    Failing to write the cache does not fail the check.
+    """
+    kern_pieces = [piece for part in kern_parts for piece in (part, "\n")]
+    with tempfile.TemporaryDirectory(prefix="verify_", dir=SCRATCH_DIR) as work_dir:
+        temp_kern = os.path.join(work_dir, "op.kern")
+        kbc_path = os.path.join(work_dir, "op.kbc")
+        output_digest_path = None
+        if cache_dir is not None:
+            key_hash = hashlib.blake2b(f"{_kernc_identity(compiler_argv[0])}\0".encode(), digest_size=16)
+            for piece in kern_pieces:
+                key_hash.update(piece.encode())
+            key = key_hash.hexdigest()
+            kbc_path = cache_dir / f"{key}.kbc"
+            output_digest_path = cache_dir / f"{key}.out"
+        
+        if not refresh and os.path.exists(kbc_path):
+            if log is not None:
+                log.append(f"  Using cached bytecode for {name}...")
+        else:
+            # Write temp KERN file
+            temp_kbc = os.path.join(work_dir, "op.kbc")
+            _write_source(temp_kern, kern_pieces)
+            
+            # Compile
+            if log is not None:
+                log.append(f"  Compiling {name}...")
+            returncode, _, stderr = await _run_kernc(
+                compiler_argv, ["--input", temp_kern, "--output", temp_kbc, "build"]
+            )
+            
+            # kernc exits 0 on parse errors too, just without writing bytecode
+            if returncode != 0 or not os.path.exists(temp_kbc):
+                if log is not None:
+                    log.append(f"  Compile failed: {stderr.decode('utf-8', 'replace')}")
+                return False
+            
+            if cache_dir is not None:
+                # Publish atomically; the scratch dir may be another filesystem
+                try:
+                    cache_dir.mkdir(parents=True, exist_ok=True)
+                    staged = kbc_path.with_suffix(f".{os.getpid()}.tmp")
+                    shutil.copyfile(temp_kbc, staged)
+                    os.replace(staged, kbc_path)
+                except OSError as e:
+                    _warn_cache_unwritable(cache_dir, e.strerror)
+                    kbc_path = temp_kbc
+        
+        if not execute:
+            return True
+        
+        # Run bytecode
+        if log is not None:
+            log.append(f"  Running {name}...")
+        returncode, stdout, stderr = await _run_kernc(
+            compiler_argv, ["--input", str(kbc_path), "run"],
+            capture_stdout=output_digest_path is not None
+        )
+        
+        if returncode != 0:
+            if log is not None:
+                log.append(f"  Execution failed: {stderr.decode('utf-8', 'replace')}")
+            return False
+        
+        if output_digest_path is not None:
+            output_digest = hashlib.blake2b(stdout, digest_size=16).hexdigest()
+            try:
+                if refresh or not output_digest_path.exists():
+                    output_digest_path.write_text(output_digest)
+                elif output_digest_path.read_text() != output_digest:
+                    if log is not None:
+                        log.append(f"  Nondeterministic: output differs from an earlier run")
+                    return False
+            except OSError as e:
+                _warn_cache_unwritable(cache_dir, e.strerror)
+        
+        return True
+
+
+def _template_digest(op: Dict[str, Any]) -> bytes:
+    """Content hash of an operator's KERN template and whether it is executed."""
+    mode = "run" if op.get("requires_execution", True) else "compile"
+    return hashlib.blake2b(f"{mode}:{op.get('kern_template', '')}".encode(), digest_size=16).digest()
+
+
+async def _verify_operator(op: Dict[str, Any], compiler_argv: List[str],
+                           cache_dir: Optional[Path] = None,
+                           refresh: bool = False) -> Tuple[str, bool, List[str]]:
+    """Verify a single operator by compiling and running its KERN template.
+    
+    Return its name, the result and the log lines to report for it.
+    """
+    log = []
+    try:
+        kern_src = op.get("kern_template", "")
+        if not kern_src:
+            log.append(f"Operator {op['name']} has no kern_template")
+            return op['name'], False, log
+        
+        ok = await _build_and_run(compiler_argv, [kern_src], op['name'], cache_dir, log,
+                                  execute=op.get("requires_execution", True), refresh=refresh)
+        return op['name'], ok, log
+    except subprocess.TimeoutExpired:
+        log.append(f"  Verification timeout for {op['name']}")
+        return op['name'], False, log
+    except Exception as e:
+        log.append(f"  Verification error: {e}")
+        return op['name'], False, log
+
+
+def _use_pidfd_child_watcher() -> None:
+    """Have asyncio reap kernc children through pidfds on Python 3.9-3.11.
+    
+    Their default ThreadedChildWatcher parks a waitpid thread per child;
+    PidfdChildWatcher registers each child's pidfd with the event loop's
+    selector instead, as Python 3.12+ does by default.
+    """
+    if sys.version_info >= (3, 12) or not hasattr(asyncio, "PidfdChildWatcher"):
+        return
+    try:
+        os.close(os.pidfd_open(os.getpid()))
+    except (AttributeError, OSError):
+        return  # no pidfd support in this kernel
+    asyncio.set_child_watcher(asyncio.PidfdChildWatcher())
+
 
 class OperatorVerifier:
-    def __init__(self, brain_path: str, compiler_path: Optional[str] = None):
+    def __init__(self, brain_path: str, compiler_path: Optional[str] = None,
+                 cache_dir: Optional[Path] = CACHE_DIR, refresh_cache: bool = False):
         """
         Initialize verifier.
         
         Args:
             brain_path: path to psi/brain.json
             compiler_path: path to kernc binary (optional; will search workspace)
+            cache_dir: bytecode and run output cache (None disables caching)
+            refresh_cache: recompile and rerun everything, replacing cache entries
         """
         self.brain_path = brain_path
+        self.cache_dir = cache_dir
+        self.refresh_cache = refresh_cache
         self.compiler_path = compiler_path or self._find_kernc()
+        # kernc is exec'd directly, without a shell in between. An absolute
+        # path (plus close_fds=False) lets subprocess launch it with
+        # posix_spawn instead of forking this process; Python's own fds are
+        # non-inheritable, so none leak into kernc.
+        self.compiler_argv = shlex.split(self.compiler_path)
+        self.compiler_argv[0] = shutil.which(self.compiler_argv[0]) or self.compiler_argv[0]
+        if len(self.compiler_argv) > 1:
+            # Behind `cargo run ...` or an interpreter, the program started
+            # is not kernc itself, so there is no binary to key the cache to
+            self.cache_dir = None
+        # Verification result per kern_template digest
+        self._verify_cache: Dict[bytes, bool] = {}
         
-        with open(brain_path) as f:
-            self.brain = json.load(f)
+        self.brain = load_brain(Path(brain_path).read_bytes())
+        # First operator of each name, as meta-programs refer to operators by name
+        self.ops_by_name = {op['name']: op for op in reversed(self.brain['operators'])}
     
-    def _find_kernc(self) -> str:
-        """Find kernc binary in workspace."""
-        # Try cargo run method
-        return "cargo run --package kern_compiler_cli --bin kernc --"
+    @staticmethod
+    @functools.lru_cache(maxsize=None)
+    def _find_kernc() -> str:
+        """Build kernc in the workspace once and return the binary's path."""
+        # Invoking the binary directly keeps cargo's up-to-date check out of
+        # every compile and run; `cargo run` is only the fallback
+        try:
+            subprocess.run(
+                ["cargo", "build", "--release", "--package", "kern_compiler_cli", "--bin", "kernc"],
+                stdout=sys.stderr,
+                check=True
+            )
+            metadata = subprocess.run(
+                ["cargo", "metadata", "--format-version", "1", "--no-deps"],
+                stdout=subprocess.PIPE,
+                check=True
+            )
+        except (OSError, subprocess.CalledProcessError) as e:
+            print(f"Could not build kernc ({e}), falling back to cargo run", file=sys.stderr)
+            return _CARGO_RUN
+        
+        target_dir = Path(json.loads(metadata.stdout)["target_directory"])
+        kernc = target_dir / "release" / ("kernc.exe" if os.name == "nt" else "kernc")
+        return shlex.quote(str(kernc)) if kernc.exists() else _CARGO_RUN
     
     def verify_all(self) -> bool:
         """Verify all operators. Return True if all pass."""
-        print(f"Verifying {len(self.brain['operators'])} operators...", file=sys.stderr)
+        operators = self.brain['operators']
+        print(f"Verifying {len(operators)} operators...", file=sys.stderr)
         
         passed = 0
         failed = 0
         
-        for op in self.brain['operators']:
-            if self._verify_operator(op):
+        # When every template builds and runs as one program, a single pair
+        # of kernc calls verifies them all
+        if self._verify_batch(operators):
+            passed = len(operators)
+            compile_only = sum(1 for op in operators if not op.get("requires_execution", True))
+            sys.stderr.write("".join(f"✓ {op['name']}\n" for op in operators))
+        else:
+            # Otherwise verify each operator by its own kernc processes to
+            # pinpoint the failures
+            passed, compile_only, failed = asyncio.run(self._verify_each(operators))
+        
+        print(f"\nVerification: {passed} passed ({passed - compile_only} executed, "
+              f"{compile_only} compile-only), {failed} failed", file=sys.stderr)
+        return failed == 0
+    
+    async def _verify_each(self, operators: List[Dict[str, Any]]) -> Tuple[int, int, int]:
+        """Verify operators concurrently and report them in brain order.
+        
+        Up to os.cpu_count() compile-and-run chains are in flight at once.
+        Operators sharing a template are only compiled and run once. Each
+        chain buffers its progress lines, which are written out with its
+        result.
+        Return the (passed, compile-only passed, failed) counts.
+        """
+        limit = asyncio.Semaphore(os.cpu_count() or 1)
+        timings = self._load_timings()
+        
+        async def verify(op, digest):
+            async with limit:
+                start = time.perf_counter()
+                result = await _verify_operator(op, self.compiler_argv, self.cache_dir,
+                                                self.refresh_cache)
+                timings[digest.hex()] = round(time.perf_counter() - start, 3)
+                return result
+        
+        passed = 0
+        compile_only = 0
+        failed = 0
+        digests = [_template_digest(op) for op in operators]
+        # Start the operators that took longest last time first, so a slow
+        # one is not left running alone at the end; new operators count as 1s
+        by_cost = sorted(zip(digests, operators), key=lambda item: -timings.get(item[0].hex(), 1.0))
+        pending = {}
+        for digest, op in by_cost:
+            if digest not in self._verify_cache and digest not in pending:
+                pending[digest] = asyncio.create_task(verify(op, digest))
+        
+        for digest, op in zip(digests, operators):
+            log = []
+            if digest in pending:
+                _, self._verify_cache[digest], log = await pending.pop(digest)
+            if self._verify_cache[digest]:
                 passed += 1
-                print(f"✓ {op['name']}", file=sys.stderr)
+                if not op.get("requires_execution", True):
+                    compile_only += 1
+                log.append(f"✓ {op['name']}")
             else:
                 failed += 1
-                print(f"✗ {op['name']}", file=sys.stderr)
+                log.append(f"✗ {op['name']}")
+            # One write per operator keeps its lines together, however the
+            # concurrent chains interleave
+            sys.stderr.write("\n".join(log) + "\n")
         
-        print(f"\nVerification: {passed} passed, {failed} failed", file=sys.stderr)
-        return failed == 0
+        self._save_timings(timings)
+        return passed, compile_only, failed
     
-    def _verify_operator(self, op: Dict[str, Any]) -> bool:
-        """Verify a single operator by compiling and running its KERN template."""
+    def _load_timings(self) -> Dict[str, float]:
+        """Load earlier runs' verification times, keyed by template digest."""
+        if self.cache_dir is None:
+            return {}
         try:
-            kern_src = op.get("kern_template", "")
-            if not kern_src:
-                print(f"Operator {op['name']} has no kern_template", file=sys.stderr)
-                return False
-            
-            # Write temp KERN file
-            temp_kern = f"/tmp/verify_{op['name']}.kern"
-            with open(temp_kern, "w") as f:
-                f.write(kern_src + "\n")
-            
-            # Compile
-            print(f"  Compiling {op['name']}...", file=sys.stderr)
-            result = subprocess.run(
-                f"{self.compiler_path} --input {temp_kern} build",
-                shell=True,
-                capture_output=True,
-                timeout=30
-            )
-            
-            if result.returncode != 0:
-                print(f"  Compile failed: {result.stderr.decode()}", file=sys.stderr)
-                return False
-            
-            # Run bytecode
-            print(f"  Running {op['name']}...", file=sys.stderr)
-            result = subprocess.run(
-                f"{self.compiler_path} --input output.kbc run",
-                shell=True,
-                capture_output=True,
-                timeout=30
-            )
-            
-            if result.returncode != 0:
-                print(f"  Execution failed: {result.stderr.decode()}", file=sys.stderr)
-                return False
-            
-            return True
-        except subprocess.TimeoutExpired:
-            print(f"  Verification timeout for {op['name']}", file=sys.stderr)
+            return json.loads((self.cache_dir / "timings.json").read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return {}
+    
+    def _save_timings(self, timings: Dict[str, float]) -> None:
+        """Persist per-operator verification times for the next run's ordering."""
+        if self.cache_dir is None:
+            return
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            with tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=self.cache_dir,
+                                             suffix=".tmp", delete=False) as f:
+                json.dump(timings, f)
+            os.replace(f.name, self.cache_dir / "timings.json")
+        except OSError as e:
+            _warn_cache_unwritable(self.cache_dir, e.strerror)
+    
+    def _verify_batch(self, operators: List[Dict[str, Any]]) -> bool:
+        """Build and run all operator templates as one KERN program."""
+        # Fewer than two operators gain nothing from batching
+        if len(operators) < 2 or not all(op.get("kern_template") for op in operators):
             return False
-        except Exception as e:
-            print(f"  Verification error: {e}", file=sys.stderr)
+        
+        kern_parts = [op["kern_template"] for op in operators]
+        execute = any(op.get("requires_execution", True) for op in operators)
+        try:
+            return asyncio.run(_build_and_run(self.compiler_argv, kern_parts, cache_dir=self.cache_dir,
+                                              execute=execute, refresh=self.refresh_cache))
+        except (subprocess.TimeoutExpired, OSError):
             return False
     
     def verify_metaprogram(self, mp_name: str) -> bool:
@@ -104,50 +426,28 @@ class OperatorVerifier:
             print(f"Meta-program {mp_name} not found", file=sys.stderr)
             return False
         
+        # Collect operator templates, written out one per line
+        kern_parts = []
+        for op_name in mp['operators']:
+            op = self.ops_by_name.get(op_name)
+            if op:
+                kern_parts.append(op.get('kern_template', ''))
+        
+        print(f"Verifying meta-program {mp_name}...", file=sys.stderr)
+        log = []
         try:
-            # Concatenate operator templates
-            kern_parts = []
-            for op_name in mp['operators']:
-                op = next((o for o in self.brain['operators'] if o['name'] == op_name), None)
-                if op:
-                    kern_parts.append(op.get('kern_template', ''))
-            
-            kern_src = "\n".join(kern_parts) + "\n"
-            
-            # Write temp file
-            temp_kern = f"/tmp/verify_mp_{mp_name}.kern"
-            with open(temp_kern, "w") as f:
-                f.write(kern_src)
-            
-            # Compile and run
-            print(f"Verifying meta-program {mp_name}...", file=sys.stderr)
-            result = subprocess.run(
-                f"{self.compiler_path} --input {temp_kern} build",
-                shell=True,
-                capture_output=True,
-                timeout=30
-            )
-            
-            if result.returncode != 0:
-                print(f"Meta-program compile failed", file=sys.stderr)
-                return False
-            
-            result = subprocess.run(
-                f"{self.compiler_path} --input output.kbc run",
-                shell=True,
-                capture_output=True,
-                timeout=30
-            )
-            
-            if result.returncode != 0:
-                print(f"Meta-program execution failed", file=sys.stderr)
-                return False
-            
-            print(f"✓ Meta-program {mp_name} verified", file=sys.stderr)
-            return True
+            ok = asyncio.run(_build_and_run(self.compiler_argv, kern_parts, mp_name, self.cache_dir,
+                                            log, refresh=self.refresh_cache))
+        except subprocess.TimeoutExpired:
+            log.append(f"  Verification timeout for {mp_name}")
+            ok = False
         except Exception as e:
-            print(f"Meta-program verification error: {e}", file=sys.stderr)
-            return False
+            log.append(f"  Verification error: {e}")
+            ok = False
+        
+        log.append(f"✓ Meta-program {mp_name} verified" if ok else f"✗ Meta-program {mp_name}")
+        sys.stderr.write("\n".join(log) + "\n")
+        return ok
 
 
 def main():
@@ -157,10 +457,13 @@ def main():
     parser.add_argument("--brain", required=True, help="Path to psi/brain.json")
     parser.add_argument("--meta-program", help="Verify a specific meta-program")
     parser.add_argument("--compiler", help="Path to kernc")
+    parser.add_argument("--no-cache", action="store_true",
+                        help=f"Recompile and rerun everything, refreshing the bytecode cached in {CACHE_DIR}")
     
     args = parser.parse_args()
     
-    verifier = OperatorVerifier(args.brain, args.compiler)
+    _use_pidfd_child_watcher()
+    verifier = OperatorVerifier(args.brain, args.compiler, refresh_cache=args.no_cache)
     
     if args.meta_program:
         success = verifier.verify_metaprogram(args.meta_program)